@@ -0,0 +1,898 @@
+#!/usr/bin/env python3
+"""
+Conversational Image Generator
+Allows iterative refinement of images through natural language commands.
+"""
+
+import os
+import re
+import sys
+import json
+import queue
+import random
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Must be set before torch initializes CUDA. Expandable segments keep the
+# allocator from fragmenting as resolutions and strengths change between
+# generations in a long session.
+os.environ.setdefault(
+    "PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:512"
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# torch and diffusers take several seconds to import, so they are only
+# imported by import_model_libraries() once the model is actually loaded
+# (PIL is likewise only imported where an image is read from disk)
+torch = None
+sdpa_kernel = None
+FluxPipeline = None
+FluxImg2ImgPipeline = None
+
+# Attention kernels allowed during denoising (never the slow math fallback)
+SDPA_BACKENDS = None
+
+# Number of prompts whose text-encoder outputs are kept on the GPU
+# (about 4MB each: 512 T5 tokens x 4096 dims in bf16, plus the CLIP vector)
+EMBED_CACHE_SIZE = 32
+
+# "offload" keeps idle components on the CPU; "sequential_offload" streams
+# individual layers in and out for the smallest footprint
+MEMORY_MODES = ("full", "offload", "sequential_offload")
+
+def import_model_libraries():
+    """Import torch and diffusers into the module namespace"""
+    global torch, sdpa_kernel, FluxPipeline, FluxImg2ImgPipeline, SDPA_BACKENDS
+    import torch
+    from torch.nn.attention import SDPBackend, sdpa_kernel
+    from diffusers import FluxPipeline, FluxImg2ImgPipeline
+    SDPA_BACKENDS = [SDPBackend.FLASH_ATTENTION, SDPBackend.EFFICIENT_ATTENTION]
+
+class ConversationalImageGen:
+    COLORS = ['red', 'blue', 'green', 'yellow', 'purple', 'orange',
+              'pink', 'black', 'white', 'brown', 'grey', 'gray']
+    # Whole-word match so e.g. "bored" is not mistaken for "red"; longest
+    # names first so multi-word colors win over the colors they contain
+    COLOR_RE = re.compile(
+        r"\b(" + "|".join(map(re.escape, sorted(COLORS, key=len, reverse=True))) + r")\b",
+        re.IGNORECASE
+    )
+    # One pass over a modification finds every intent keyword it contains;
+    # the name of the matching group is the intent
+    INTENT_RE = re.compile(
+        r"\b(?:(?P<change>make|change)|(?P<add>add)|(?P<remove>remove|without))\b",
+        re.IGNORECASE
+    )
+    ADD_RE = re.compile(r"\badd\b", re.IGNORECASE)
+    
+    def __init__(self, output_dir="./outputs", compile_model=False, fp8=False,
+                 fp16_accumulate=False, memory_mode="full", schnell=False,
+                 fp8_rowwise=False):
+        if memory_mode not in MEMORY_MODES:
+            raise ValueError(
+                f"memory_mode must be one of {', '.join(MEMORY_MODES)}, got {memory_mode!r}"
+            )
+        
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(exist_ok=True)
+        
+        self.session_file = self.output_dir / "session.json"
+        self.current_image = None
+        self.current_prompt = ""
+        self.current_seed = None
+        self.generation_count = 0
+        self.history = []
+        
+        # generation_count already orders images, so filenames only need the
+        # session start time rather than a fresh timestamp per image
+        self.session_stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        # (path, PIL image) of the last generated image, so refining it does
+        # not have to wait for the PNG to be written and decode it again
+        self._last_image = None
+        self._warmed_up = False
+        
+        # prompt -> (prompt_embeds, pooled_prompt_embeds), most recent last
+        self._embed_cache = OrderedDict()
+        
+        # Session snapshots are written to disk by a background thread so
+        # saving never blocks the REPL after a generation
+        self._session_queue = queue.Queue()
+        self._session_writer = threading.Thread(
+            target=self._session_writer_loop, daemon=True
+        )
+        self._session_writer.start()
+        
+        # PNG encoding runs off the critical path; refinements wait on the
+        # pending save of their source image before reading it back
+        self._save_executor = ThreadPoolExecutor(max_workers=2)
+        self._pending_saves = {}
+        
+        import_model_libraries()
+        torch.cuda.set_per_process_memory_fraction(0.95)
+        
+        if schnell:
+            # Timestep-distilled preview model: 4 steps and no guidance
+            self.model_id = "black-forest-labs/FLUX.1-schnell"
+            self.default_steps = 4
+            self.guidance_scale = 0.0
+            self.max_sequence_length = 256
+        else:
+            # FLUX.1-dev is guidance-distilled: guidance_scale is fed to the
+            # transformer as an embedding, so each step is a single forward
+            # pass rather than a conditional + unconditional CFG pair
+            self.model_id = "black-forest-labs/FLUX.1-dev"
+            self.default_steps = 28
+            self.guidance_scale = 3.5
+            self.max_sequence_length = 512
+        
+        print(f"🎨 Loading {self.model_id.split('/')[-1]} model... (this may take a minute)")
+        self.txt2img_pipe = FluxPipeline.from_pretrained(
+            self.model_id,
+            torch_dtype=torch.bfloat16
+        )
+        
+        if fp8:
+            # Only the transformer is quantized; it dominates memory bandwidth,
+            # while the text encoders and VAE stay in bf16
+            from optimum.quanto import quantize, freeze, qfloat8
+            print("⚙️  Quantizing transformer to FP8...")
+            quantize(self.txt2img_pipe.transformer, weights=qfloat8)
+            freeze(self.txt2img_pipe.transformer)
+        
+        if fp8_rowwise:
+            # FP8 weights and activations run the matmuls on FP8 tensor cores.
+            # Like --fp8 this happens before placement: sequential offload
+            # moves the weights to meta tensors, which cannot be quantized.
+            print("⚙️  Quantizing transformer to row-wise FP8...")
+            self.quantize_fp8_rowwise(self.txt2img_pipe.transformer)
+        
+        if fp16_accumulate:
+            # FP16-accumulate matmuls need fp16 weights, but only the
+            # transformer is converted: T5 would have to clip its activations
+            # in fp16, so the text encoders and VAE stay in bf16
+            print("⚙️  Swapping transformer blocks to FP16-accumulate linears...")
+            self.txt2img_pipe.transformer.to(torch.float16)
+            self.swap_fp16_accumulate_linears(self.txt2img_pipe.transformer)
+            self.cast_vae_io(self.txt2img_pipe.vae, torch.float16)
+        
+        # The img2img pipeline shares the same offloaded modules
+        if memory_mode == "offload":
+            self.txt2img_pipe.enable_model_cpu_offload()
+        elif memory_mode == "sequential_offload":
+            self.txt2img_pipe.enable_sequential_cpu_offload()
+        else:
+            self.txt2img_pipe.to("cuda")
+        
+        if memory_mode != "full":
+            # VAE decode is where the final VRAM spike hits
+            self.txt2img_pipe.vae.enable_tiling()
+            self.txt2img_pipe.vae.enable_slicing()
+        
+        self.txt2img_pipe.vae.to(memory_format=torch.channels_last)
+        self.txt2img_pipe.transformer.to(memory_format=torch.channels_last)
+        
+        if compile_model:
+            print("⚙️  Compiling model...")
+            self.compile_pipeline(self.txt2img_pipe)
+        
+        # img2img reuses the already-loaded (and possibly compiled) components
+        # rather than loading a second copy of the model onto the GPU
+        self.img2img_pipe = FluxImg2ImgPipeline(
+            vae=self.txt2img_pipe.vae,
+            text_encoder=self.txt2img_pipe.text_encoder,
+            text_encoder_2=self.txt2img_pipe.text_encoder_2,
+            tokenizer=self.txt2img_pipe.tokenizer,
+            tokenizer_2=self.txt2img_pipe.tokenizer_2,
+            transformer=self.txt2img_pipe.transformer,
+            scheduler=self.txt2img_pipe.scheduler
+        )
+        
+        # Reseeded on every call instead of allocating new CUDA RNG state
+        self._gen_txt2img = torch.Generator("cuda")
+        self._gen_img2img = torch.Generator("cuda")
+        
+        if compile_model:
+            print("⚙️  Warming up compiled model... (this may take a few minutes)")
+            self.warmup()
+        
+        print("✅ Model loaded! Ready to generate.\n")
+        
+        # Load previous session if exists
+        self.load_session()
+    
+    def swap_fp16_accumulate_linears(self, transformer):
+        """Replace nn.Linear layers in the transformer blocks with CublasLinear"""
+        from cublas_ops import CublasLinear
+        
+        def swap(module):
+            for name, child in module.named_children():
+                if isinstance(child, torch.nn.Linear):
+                    linear = CublasLinear(
+                        child.in_features,
+                        child.out_features,
+                        bias=child.bias is not None,
+                        device=child.weight.device,
+                        dtype=child.weight.dtype
+                    )
+                    linear.weight.data = child.weight.data
+                    if child.bias is not None:
+                        linear.bias.data = child.bias.data
+                    setattr(module, name, linear)
+                else:
+                    swap(child)
+        
+        # The double and single stream blocks hold almost all the weights;
+        # the embedders and final projection are left alone for quality
+        swap(transformer.transformer_blocks)
+        swap(transformer.single_transformer_blocks)
+    
+    def cast_vae_io(self, vae, dtype):
+        """Run the VAE in its own dtype when the transformer's latents use `dtype`"""
+        # The pipelines create latents in the prompt embeddings' dtype and
+        # hand them to the VAE without casting, in both directions
+        def to_vae_dtype(module, args):
+            return (args[0].to(vae.dtype),) + args[1:]
+        
+        def to_latent_dtype(module, args, output):
+            return output.to(dtype)
+        
+        vae.encoder.register_forward_pre_hook(to_vae_dtype)
+        vae.encoder.register_forward_hook(to_latent_dtype)
+        vae.decoder.register_forward_pre_hook(to_vae_dtype)
+    
+    def quantize_fp8_rowwise(self, transformer):
+        """Quantize the transformer block linears to row-wise FP8 with torchao"""
+        from torchao.quantization import (
+            quantize_, Float8DynamicActivationFloat8WeightConfig, PerRow
+        )
+        
+        def is_block_linear(module, fqn):
+            # Embedders, the final projection and small layers stay in bf16,
+            # where FP8 costs accuracy for little speedup
+            return (
+                isinstance(module, torch.nn.Linear)
+                and fqn.startswith(("transformer_blocks.", "single_transformer_blocks."))
+                and module.in_features >= 64
+                and module.out_features >= 64
+            )
+        
+        quantize_(
+            transformer,
+            Float8DynamicActivationFloat8WeightConfig(granularity=PerRow()),
+            filter_fn=is_block_linear
+        )
+    
+    def compile_pipeline(self, pipe):
+        """Wrap the transformer and VAE decoder of a pipeline with torch.compile"""
+        pipe.transformer = torch.compile(
+            pipe.transformer, mode="reduce-overhead", fullgraph=True
+        )
+        pipe.vae.decode = torch.compile(
+            pipe.vae.decode, mode="reduce-overhead", fullgraph=True
+        )
+    
+    def warmup(self):
+        """Run a short throwaway generation so compilation happens at startup"""
+        # The compiled graphs are per denoising step, so two steps at the
+        # full resolution are enough to trigger every compilation
+        with sdpa_kernel(SDPA_BACKENDS):
+            self.txt2img_pipe(
+                "warmup",
+                guidance_scale=self.guidance_scale,
+                num_inference_steps=2,
+                height=1024,
+                width=1024,
+                max_sequence_length=self.max_sequence_length,
+                generator=self._gen_txt2img.manual_seed(0)
+            )
+        self.release_warmup_memory()
+    
+    def load_session(self):
+        """Load previous session if it exists"""
+        if self.session_file.exists():
+            payload = self.session_file.read_bytes()
+            if orjson is not None:
+                data = orjson.loads(payload)
+            else:
+                data = json.loads(payload)
+            self.current_prompt = data.get('current_prompt', '')
+            self.current_seed = data.get('current_seed')
+            self.generation_count = data.get('generation_count', 0)
+            self.history = data.get('history', [])
+            last_image = data.get('current_image')
+            if last_image and Path(last_image).exists():
+                self.current_image = last_image
+                print(f"📂 Loaded previous session. Last image: {last_image}")
+                print(f"   Last prompt: {self.current_prompt}\n")
+    
+    def save_session(self):
+        """Queue a snapshot of the current session state to be saved"""
+        data = {
+            'current_prompt': self.current_prompt,
+            'current_seed': self.current_seed,
+            'current_image': self.current_image,
+            'generation_count': self.generation_count,
+            'history': list(self.history)
+        }
+        # The snapshot is written only once the images it refers to are on disk
+        self._session_queue.put((data, list(self._pending_saves.values())))
+    
+    def write_session(self, data):
+        """Atomically write a session snapshot to the session file"""
+        if orjson is not None:
+            payload = orjson.dumps(data)
+        else:
+            payload = json.dumps(data).encode()
+        tmp_file = self.session_file.with_suffix('.json.tmp')
+        tmp_file.write_bytes(payload)
+        os.replace(tmp_file, self.session_file)
+    
+    def _session_writer_loop(self):
+        """Write queued session snapshots until a None sentinel is received"""
+        while True:
+            data = self._session_queue.get()
+            stop = data is None
+            # Only the newest snapshot matters; skip any already superseded
+            while not stop and not self._session_queue.empty():
+                newer = self._session_queue.get()
+                self._session_queue.task_done()
+                if newer is None:
+                    stop = True
+                else:
+                    data = newer
+            
+            if data is not None:
+                snapshot, image_saves = data
+                wait(image_saves)
+                try:
+                    self.write_session(snapshot)
+                except Exception as e:
+                    print(f"❌ Failed to save session: {e}")
+            self._session_queue.task_done()
+            
+            if stop:
+                return
+    
+    def save_image(self, image, filepath):
+        """Encode and write an image in the background"""
+        self._pending_saves = {
+            path: future for path, future in self._pending_saves.items()
+            if not future.done()
+        }
+        # zlib level 1 encodes several times faster than the default level 6
+        # for slightly larger files
+        future = self._save_executor.submit(image.save, filepath, compress_level=1)
+        future.add_done_callback(self._report_save_error)
+        self._pending_saves[str(filepath)] = future
+    
+    def _report_save_error(self, future):
+        """Print the error of a failed background image save"""
+        if future.exception() is not None:
+            print(f"❌ Failed to save image: {future.exception()}")
+    
+    def wait_for_image(self, filepath):
+        """Block until a pending background save of filepath has finished"""
+        future = self._pending_saves.pop(str(filepath), None)
+        if future is not None:
+            future.result()
+    
+    def flush_session(self):
+        """Block until all queued session snapshots have been written"""
+        self._session_queue.join()
+    
+    def close(self):
+        """Finish pending image and session writes and stop the writer thread"""
+        self._save_executor.shutdown(wait=True)
+        self._session_queue.put(None)
+        self._session_writer.join()
+    
+    def encode_prompt(self, prompt):
+        """Return (prompt_embeds, pooled_prompt_embeds), reusing cached encodings"""
+        if prompt in self._embed_cache:
+            self._embed_cache.move_to_end(prompt)
+            return self._embed_cache[prompt]
+        
+        with torch.no_grad():
+            prompt_embeds, pooled_prompt_embeds, _ = self.txt2img_pipe.encode_prompt(
+                prompt=prompt,
+                prompt_2=None,
+                device=self.txt2img_pipe._execution_device,
+                max_sequence_length=self.max_sequence_length
+            )
+        
+        # The transformer may run in a different dtype than the text encoders
+        dtype = self.txt2img_pipe.transformer.dtype
+        prompt_embeds = prompt_embeds.to(dtype)
+        pooled_prompt_embeds = pooled_prompt_embeds.to(dtype)
+        
+        self._embed_cache[prompt] = (prompt_embeds, pooled_prompt_embeds)
+        if len(self._embed_cache) > EMBED_CACHE_SIZE:
+            self._embed_cache.popitem(last=False)
+        return prompt_embeds, pooled_prompt_embeds
+    
+    def batch_prompt(self, prompt, variants):
+        """Return the prompt's embeddings repeated once per variant"""
+        # The pipelines only expand embeddings themselves when they encode the
+        # prompt, so cached embeddings are batched here; they are still
+        # computed once no matter how many variants are generated
+        prompt_embeds, pooled_prompt_embeds = self.encode_prompt(prompt)
+        if variants > 1:
+            prompt_embeds = prompt_embeds.repeat(variants, 1, 1)
+            pooled_prompt_embeds = pooled_prompt_embeds.repeat(variants, 1)
+        return prompt_embeds, pooled_prompt_embeds
+    
+    def release_warmup_memory(self):
+        """Return blocks cached during the first generation to the allocator once"""
+        if not self._warmed_up:
+            torch.cuda.empty_cache()
+            self._warmed_up = True
+    
+    def generate_from_scratch(self, prompt, steps=None, seed=None, variants=1):
+        """Generate new image(s) from text prompt, returning the first"""
+        if steps is None:
+            steps = self.default_steps
+        if seed is None:
+            seed = random.getrandbits(32)
+        
+        generator = self._gen_txt2img.manual_seed(seed)
+        self.current_seed = seed
+        
+        print(f"🎨 Generating: '{prompt}'")
+        print(f"   Seed: {seed}, Steps: {steps}")
+        
+        prompt_embeds, pooled_prompt_embeds = self.batch_prompt(prompt, variants)
+        
+        with sdpa_kernel(SDPA_BACKENDS):
+            images = self.txt2img_pipe(
+                prompt_embeds=prompt_embeds,
+                pooled_prompt_embeds=pooled_prompt_embeds,
+                max_sequence_length=self.max_sequence_length,
+                guidance_scale=self.guidance_scale,
+                num_inference_steps=steps,
+                height=1024,
+                width=1024,
+                generator=generator
+            ).images
+        self.release_warmup_memory()
+        
+        # Save images and add them to history
+        filepaths = []
+        for variant, image in enumerate(images, 1):
+            self.generation_count += 1
+            filename = f"gen_{self.generation_count:03d}_{self.session_stamp}.png"
+            filepath = self.output_dir / filename
+            self.save_image(image, filepath)
+            filepaths.append(str(filepath))
+            
+            self.history.append({
+                'type': 'new',
+                'prompt': prompt,
+                'seed': seed,
+                'steps': steps,
+                'variant': variant,
+                'variants': variants,
+                'image': str(filepath)
+            })
+            print(f"✅ Saved to: {filepath}")
+        print()
+        
+        # The first variant becomes the current image
+        self.current_image = filepaths[0]
+        self._last_image = (self.current_image, images[0])
+        self.current_prompt = prompt
+        
+        self.save_session()
+        
+        return images[0]
+    
+    def refine_image(self, modification, strength=0.6, steps=None, variants=1):
+        """Refine current image based on modification request, returning the first variant"""
+        if steps is None:
+            steps = self.default_steps
+        if self.current_image is None:
+            print("❌ No current image to refine. Generate one first!")
+            return None
+        
+        # Load current image
+        if self._last_image is not None and self._last_image[0] == self.current_image:
+            image = self._last_image[1]
+        else:
+            from PIL import Image
+            self.wait_for_image(self.current_image)
+            image = Image.open(self.current_image)
+        
+        # Build new prompt incorporating the modification
+        new_prompt = self.build_refined_prompt(modification)
+        
+        print(f"🔧 Refining: '{modification}'")
+        print(f"   New prompt: '{new_prompt}'")
+        print(f"   Strength: {strength}, Steps: {steps}")
+        
+        generator = self._gen_img2img.manual_seed(self.current_seed)
+        
+        prompt_embeds, pooled_prompt_embeds = self.batch_prompt(new_prompt, variants)
+        
+        with sdpa_kernel(SDPA_BACKENDS):
+            images = self.img2img_pipe(
+                prompt_embeds=prompt_embeds,
+                pooled_prompt_embeds=pooled_prompt_embeds,
+                max_sequence_length=self.max_sequence_length,
+                image=image,
+                strength=strength,
+                guidance_scale=self.guidance_scale,
+                num_inference_steps=steps,
+                generator=generator
+            ).images
+        self.release_warmup_memory()
+        
+        # Save refined images and add them to history
+        filepaths = []
+        for variant, refined in enumerate(images, 1):
+            self.generation_count += 1
+            filename = f"gen_{self.generation_count:03d}_{self.session_stamp}_refined.png"
+            filepath = self.output_dir / filename
+            self.save_image(refined, filepath)
+            filepaths.append(str(filepath))
+            
+            self.history.append({
+                'type': 'refinement',
+                'modification': modification,
+                'prompt': new_prompt,
+                'strength': strength,
+                'steps': steps,
+                'variant': variant,
+                'variants': variants,
+                'image': str(filepath)
+            })
+            print(f"✅ Saved to: {filepath}")
+        print()
+        
+        # The first variant becomes the current image
+        self.current_image = filepaths[0]
+        self._last_image = (self.current_image, images[0])
+        self.current_prompt = new_prompt
+        
+        self.save_session()
+        
+        return images[0]
+    
+    def build_refined_prompt(self, modification):
+        """
+        Intelligently build a new prompt based on modification request.
+        This is a simple implementation - could be enhanced with an LLM.
+        """
+        # Simple keyword-based modifications
+        # Check for color changes
+        new_color = self.COLOR_RE.search(modification)
+        if new_color:
+            # Replace the existing color in the prompt, if it has one
+            color = new_color.group(1).lower()
+            new_prompt, replaced = self.COLOR_RE.subn(
+                lambda m: color, self.current_prompt, count=1
+            )
+            if replaced:
+                return new_prompt
+        
+        intents = {m.lastgroup for m in self.INTENT_RE.finditer(modification)}
+        
+        # Check for "make X Y" or "change X to Y" patterns
+        if 'change' in intents:
+            # Append the modification to the prompt
+            return f"{self.current_prompt}, {modification}"
+        
+        # Check for additions
+        if 'add' in intents:
+            addition = self.ADD_RE.sub('', modification, count=1).strip()
+            return f"{self.current_prompt}, with {addition}"
+        
+        # Check for removals
+        if 'remove' in intents:
+            # This is tricky without NLP, just note it
+            return f"{self.current_prompt}, {modification}"
+        
+        # Default: append the modification
+        return f"{self.current_prompt}, {modification}"
+    
+    def show_history(self):
+        """Display generation history"""
+        if not self.history:
+            print("No history yet!")
+            return
+        
+        print("\n📜 Generation History:")
+        print("=" * 60)
+        for i, entry in enumerate(self.history, 1):
+            print(f"\n{i}. {entry['type'].upper()}")
+            if entry['type'] == 'new':
+                print(f"   Prompt: {entry['prompt']}")
+                print(f"   Seed: {entry['seed']}, Steps: {entry['steps']}")
+            else:
+                print(f"   Modification: {entry['modification']}")
+                print(f"   Result prompt: {entry['prompt']}")
+                print(f"   Strength: {entry['strength']}, Steps: {entry['steps']}")
+            # The seed only reproduces a variant at the same batch position,
+            # so it is shown with the batch it came from
+            if entry.get('variants', 1) > 1:
+                print(f"   Variant: {entry['variant']} of {entry['variants']}")
+            print(f"   Image: {entry['image']}")
+        print("=" * 60 + "\n")
+    
+    def clear_session(self):
+        """Clear current session"""
+        self.current_image = None
+        self.current_prompt = ""
+        self.current_seed = None
+        self.history = []
+        self._last_image = None
+        self.flush_session()
+        if self.session_file.exists():
+            self.session_file.unlink()
+        print("✅ Session cleared!\n")
+
+def print_help():
+    """Print help message"""
+    print("""
+Conversational Image Generator - Commands:
+==========================================
+
+GENERATE NEW IMAGE:
+  new <prompt>              Generate a new image from scratch
+  new <prompt> --steps N    Generate with N inference steps (default: 28, 4 with --schnell)
+  new <prompt> --seed N     Generate with specific seed
+  new <prompt> --variants N Generate N variants in one batch (first becomes current)
+
+REFINE CURRENT IMAGE:
+  <modification>            Refine current image with natural language
+                           Examples: "make the ball red"
+                                    "add a sunset in background"
+                                    "change to watercolor style"
+  
+  refine <mod> --strength N Refine with specific strength (0.0-1.0)
+                           0.3 = subtle, 0.6 = moderate, 0.8 = major
+  refine <mod> --variants N Refine into N variants in one batch
+                           
+UTILITY:
+  history                   Show generation history
+  current                   Show current image info
+  clear                     Clear current session
+  help                      Show this message
+  exit                      Exit program
+
+Examples:
+  > new a blue ball on green grass
+  > make the ball red
+  > add clouds in the sky
+  > change to sunset lighting
+""")
+
+class CommandParser(argparse.ArgumentParser):
+    """Argument parser for REPL commands that reports errors instead of exiting"""
+    def error(self, message):
+        raise ValueError(message)
+
+def positive_int(value):
+    """argparse type for integers of at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+def strength_float(value):
+    """argparse type for img2img strengths, above 0 and at most 1"""
+    number = float(value)
+    # A strength of 0 would leave img2img with no denoising steps to run
+    if not 0 < number <= 1:
+        raise argparse.ArgumentTypeError(f"must be above 0 and at most 1, got {number}")
+    return number
+
+def seed_int(value):
+    """argparse type for seeds torch.Generator.manual_seed accepts"""
+    number = int(value)
+    if not 0 <= number < 2**64:
+        raise argparse.ArgumentTypeError(f"must be between 0 and 2**64 - 1, got {number}")
+    return number
+
+def parse_command(parser, args):
+    """Split REPL arguments into (options, prompt words) with a command parser"""
+    # argparse reads a bare '--' as the end of options, but in a prompt it is
+    # a dash, so it is left out of parsing and put back among the words
+    options, words = parser.parse_known_args([arg for arg in args if arg != '--'])
+    words = iter(words)
+    next_word = next(words, None)
+    prompt_parts = []
+    for arg in args:
+        if arg == '--':
+            prompt_parts.append(arg)
+        elif arg == next_word:
+            prompt_parts.append(arg)
+            next_word = next(words, None)
+    return options, prompt_parts
+
+NEW_PARSER = CommandParser(prog='new', add_help=False, allow_abbrev=False)
+NEW_PARSER.add_argument('--steps', type=positive_int, default=None)
+NEW_PARSER.add_argument('--seed', type=seed_int, default=None)
+NEW_PARSER.add_argument('--variants', type=positive_int, default=1)
+
+REFINE_PARSER = CommandParser(prog='refine', add_help=False, allow_abbrev=False)
+REFINE_PARSER.add_argument('--strength', type=strength_float, default=0.6)
+REFINE_PARSER.add_argument('--steps', type=positive_int, default=None)
+REFINE_PARSER.add_argument('--variants', type=positive_int, default=1)
+
+def command_exit(gen, args):
+    """Exit the REPL"""
+    print("👋 Goodbye!")
+    return True
+
+def command_help(gen, args):
+    """Show the help message"""
+    print_help()
+
+def command_history(gen, args):
+    """Show generation history"""
+    gen.show_history()
+
+def command_current(gen, args):
+    """Show current image info"""
+    if gen.current_image:
+        print(f"\n📷 Current image: {gen.current_image}")
+        print(f"   Prompt: {gen.current_prompt}")
+        print(f"   Seed: {gen.current_seed}\n")
+    else:
+        print("\n❌ No current image. Generate one first!\n")
+
+def command_clear(gen, args):
+    """Clear current session"""
+    gen.clear_session()
+
+def command_new(gen, args):
+    """Generate a new image: new <prompt> [--steps N] [--seed N] [--variants N]"""
+    try:
+        options, prompt_parts = parse_command(NEW_PARSER, args)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    
+    prompt = ' '.join(prompt_parts)
+    if prompt:
+        gen.generate_from_scratch(
+            prompt, steps=options.steps, seed=options.seed, variants=options.variants
+        )
+    else:
+        print("❌ Please provide a prompt after 'new'")
+
+def command_refine(gen, args):
+    """Refine the current image: refine <mod> [--strength N] [--steps N] [--variants N]"""
+    try:
+        options, mod_parts = parse_command(REFINE_PARSER, args)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    
+    modification = ' '.join(mod_parts)
+    if modification:
+        gen.refine_image(
+            modification, strength=options.strength, steps=options.steps,
+            variants=options.variants
+        )
+    else:
+        print("❌ Please provide a modification after 'refine'")
+
+# Commands that are only recognised when typed on their own
+COMMANDS = {
+    'exit': command_exit, 'quit': command_exit, 'q': command_exit,
+    'help': command_help, 'h': command_help, '?': command_help,
+    'history': command_history,
+    'current': command_current,
+    'clear': command_clear,
+}
+
+# Commands that take a prompt/modification and options
+ARGUMENT_COMMANDS = {
+    'new': command_new,
+    'refine': command_refine,
+}
+
+def parse_args():
+    """Parse command-line options"""
+    parser = argparse.ArgumentParser(description="Conversational Image Generator")
+    parser.add_argument(
+        "--compile", action="store_true",
+        help="torch.compile the model for faster generation (slow first run)"
+    )
+    # All of these replace the transformer's linear layers
+    precision = parser.add_mutually_exclusive_group()
+    precision.add_argument(
+        "--fp8", action="store_true",
+        help="Quantize the transformer to FP8 (requires optimum-quanto)"
+    )
+    precision.add_argument(
+        "--fp8-rowwise", action="store_true",
+        help="Quantize the transformer to row-wise FP8 weights and activations "
+             "(requires torchao and an RTX 40xx or newer GPU)"
+    )
+    precision.add_argument(
+        "--fp16-accumulate", action="store_true",
+        help="Run the transformer in fp16 with FP16-accumulate matmuls "
+             "(requires torch-cublas-hgemm)"
+    )
+    memory = parser.add_mutually_exclusive_group()
+    memory.add_argument(
+        "--low-vram", dest="memory_mode", action="store_const",
+        const="offload", default="full",
+        help="Offload idle model components to the CPU (slower, for 16GB GPUs)"
+    )
+    memory.add_argument(
+        "--lowest-vram", dest="memory_mode", action="store_const",
+        const="sequential_offload",
+        help="Offload layer by layer (much slower, for 12GB GPUs)"
+    )
+    parser.add_argument(
+        "--schnell", action="store_true",
+        help="Use FLUX.1-schnell (4 steps) for fast previews"
+    )
+    args = parser.parse_args()
+    if args.compile and args.fp16_accumulate:
+        # CublasLinear's extension call cannot be traced into a full graph
+        parser.error("--compile cannot be combined with --fp16-accumulate")
+    return args
+
+def main():
+    args = parse_args()
+    
+    print("=" * 60)
+    print("  🎨 Conversational Image Generator")
+    print("=" * 60)
+    print("\nType 'help' for commands or 'exit' to quit.\n")
+    
+    gen = ConversationalImageGen(
+        compile_model=args.compile,
+        fp8=args.fp8,
+        fp16_accumulate=args.fp16_accumulate,
+        memory_mode=args.memory_mode,
+        schnell=args.schnell,
+        fp8_rowwise=args.fp8_rowwise
+    )
+    
+    while True:
+        try:
+            user_input = input("🎨 > ").strip()
+            
+            if not user_input:
+                continue
+            
+            parts = user_input.split()
+            cmd = parts[0].lower()
+            
+            if len(parts) == 1 and cmd in COMMANDS:
+                if COMMANDS[cmd](gen, []):
+                    break
+            elif cmd in ARGUMENT_COMMANDS:
+                ARGUMENT_COMMANDS[cmd](gen, parts[1:])
+            else:
+                # Assume it's a refinement request
+                if gen.current_image:
+                    gen.refine_image(user_input)
+                else:
+                    print("❌ No current image to refine. Use 'new <prompt>' to generate one first!")
+        
+        except KeyboardInterrupt:
+            print("\n\n👋 Goodbye!")
+            break
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    gen.close()
+
+if __name__ == "__main__":
+    main()